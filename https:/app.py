@@ -31,6 +31,8 @@ from database import (
     delete_category,         # Für Tab 4
     update_category
 )
+from export import EXPORT_FORMATS, EXPORT_DATASETS, write_export, remove_export, export_exists, export_url
+from connection import get_metrics, reset_stale_flag, served_stale_data, DB_ERRORS
 
 st.set_page_config(page_title="CIO Cockpit Final", layout="wide", page_icon="🏢")
 
@@ -118,6 +120,7 @@ def local_css(bg_app, bg_card, txt_col, delta_col):
 kpi_func = local_css(main_bg, card_bg, text_color, delta_color)
 
 # --- DATEN LADEN ---
+reset_stale_flag()
 try:
     raw_projects = get_projects()
     raw_stats = get_stats()
@@ -139,6 +142,10 @@ except Exception as e:
     st.error(f"Datenbank Fehler: {e}")
     df_proj, df_stats, df_act = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
+# DB gestört -> es wurden die zuletzt geladenen Daten geliefert
+if served_stale_data():
+    st.warning("⚠️ Datenbank aktuell nicht erreichbar – es werden die zuletzt geladenen Daten angezeigt.")
+
 # ------------------------------------------------------------------
 # TAB 1: MANAGEMENT DASHBOARD
 # ------------------------------------------------------------------
@@ -252,7 +259,10 @@ elif selected == "1. Basis-Budget (OPEX)":
                 d['year'] = 2026; d['scenario'] = fixed_scen; d['status'] = 'Planned Base'
                 if 'id' in d: del d['id']
                 if 'created_at' in d: del d['created_at']
-                insert_bulk_projects(d.to_dict('records')); st.rerun()
+                try:
+                    insert_bulk_projects(d.to_dict('records')); st.rerun()
+                except DB_ERRORS as e:
+                    st.error(f"Datenbank Fehler: {e}")
 
             with c1:
                 st.markdown(f'<div class="css-card"><h4>Flat</h4><h3>{fmt_de(val_25,0)}</h3></div>', unsafe_allow_html=True)
@@ -351,9 +361,12 @@ elif selected == "2. Projekt-Planung":
             if c_b2.form_submit_button("💾 Speichern", type="primary"):
                 d = st.session_state.wiz_data.copy()
                 d.update({'risk_factor':r, 'strategic_score':s, 'scenario':'Planned Project', 'status':'Planned'})
-                insert_bulk_projects([d])
-                st.success("Gespeichert!")
-                st.session_state.wiz_data={}; st.session_state.wizard_step=1; time.sleep(1); st.rerun()
+                try:
+                    insert_bulk_projects([d])
+                    st.success("Gespeichert!")
+                    st.session_state.wiz_data={}; st.session_state.wizard_step=1; time.sleep(1); st.rerun()
+                except DB_ERRORS as e:
+                    st.error(f"Datenbank Fehler: {e}")
 
 # ------------------------------------------------------------------
 # TAB 4: SZENARIO SIMULATOR
@@ -397,7 +410,10 @@ elif selected == "Szenario-Simulator":
                     df_sim['scenario'] = n
                     if 'id' in df_sim: del df_sim['id']
                     if 'created_at' in df_sim: del df_sim['created_at']
-                    insert_bulk_projects(df_sim.to_dict('records')); st.success("Gespeichert!")
+                    try:
+                        insert_bulk_projects(df_sim.to_dict('records')); st.success("Gespeichert!")
+                    except DB_ERRORS as e:
+                        st.error(f"Datenbank Fehler: {e}")
 
 # ------------------------------------------------------------------
 # TAB 5, 6, 7 (VERGLEICH, ANALYSE, PORTFOLIO)
@@ -456,14 +472,13 @@ elif selected == "Portfolio & Risiko":
 elif selected == "Administration":
     st.title("🛠️ Administration & Einstellungen")
     
-    # Jetzt mit 4 Tabs
-    t1, t2, t3, t4 = st.tabs(["🎲 Historie (22-25)", "📅 Ist-Werte 26", "⚠️ Reset", "🏷️ Kategorien"])
+    # Jetzt mit 6 Tabs
+    t1, t2, t3, t4, t5, t6 = st.tabs(["🎲 Historie (22-25)", "📅 Ist-Werte 26", "⚠️ Reset", "🏷️ Kategorien", "📤 Export", "📡 Verbindung"])
     
     # --- TAB 1: HISTORIE ---
     with t1:
         st.markdown("**Erzeugt Projekte UND Mitarbeiterzahlen (2022-2025)**")
         if st.button("🚀 Historie generieren"):
-            delete_all_projects(); delete_all_stats(); delete_all_actuals()
             stats_list, projs_list = [], []
             # Dummy Daten Generierung
             for y in [2022, 2023, 2024, 2025]:
@@ -475,45 +490,60 @@ elif selected == "Administration":
                 for i in range(4):
                     projs_list.append({"project_name": f"Projekt {y}-{i}", "category": random.choice(["Cloud","Security"]), "budget_type": "CAPEX", "year": y, "cost_planned": random.randint(50000, 200000), "scenario": "Actual", "status": "Closed"})
             
-            insert_bulk_stats(stats_list)
-            insert_bulk_projects(projs_list)
-            st.success("Historie erfolgreich angelegt!"); time.sleep(1); st.rerun()
+            try:
+                delete_all_projects(); delete_all_stats(); delete_all_actuals()
+                insert_bulk_stats(stats_list)
+                insert_bulk_projects(projs_list)
+                st.success("Historie erfolgreich angelegt!"); time.sleep(1); st.rerun()
+            except DB_ERRORS as e:
+                st.error(f"Datenbank Fehler: {e}")
             
     # --- TAB 2: IST-WERTE ---
     with t2:
         m = st.selectbox("Monat für Buchung", range(1,13))
         if st.button("Ist-Kosten simulieren"):
             # Wir holen uns die Projekte (Hier wird df_proj benötigt - notfalls laden wir es kurz neu)
-            raw_projs = get_projects()
-            if not raw_projs:
-                st.error("Keine Projekte gefunden. Bitte erst Historie generieren.")
+            # Ohne Cache-Fallback: sonst würden Ist-Kosten auf gelöschte Projekt-IDs gebucht
+            try:
+                raw_projs = get_projects(allow_stale=False)
+            except DB_ERRORS as e:
+                st.error(f"Datenbank Fehler: {e}")
             else:
-                df_temp = pd.DataFrame(raw_projs)
-                # Filtern auf 2026er Budget Projekte
-                pl = df_temp[(df_temp['year']==2026) & (df_temp['scenario'].isin(['Budget 2026 (Fixed)', 'Planned Project']))]
-                
-                if pl.empty: 
-                    st.warning("Keine geplanten Projekte für 2026 gefunden.")
+                if not raw_projs:
+                    st.error("Keine Projekte gefunden. Bitte erst Historie generieren.")
                 else:
-                    a = []
-                    for _,r in pl.iterrows(): 
-                        a.append({
-                            "project_id": r['id'], 
-                            "year": 2026, 
-                            "month": m, 
-                            "cost_actual": (r['cost_planned']/12)*random.uniform(0.9,1.1)
-                        })
-                    insert_bulk_actuals(a)
-                    st.success(f"Ist-Kosten für Monat {m} gebucht!"); time.sleep(1); st.rerun()
+                    df_temp = pd.DataFrame(raw_projs)
+                    # Filtern auf 2026er Budget Projekte
+                    pl = df_temp[(df_temp['year']==2026) & (df_temp['scenario'].isin(['Budget 2026 (Fixed)', 'Planned Project']))]
+                
+                    if pl.empty: 
+                        st.warning("Keine geplanten Projekte für 2026 gefunden.")
+                    else:
+                        a = []
+                        for _,r in pl.iterrows(): 
+                            a.append({
+                                "project_id": r['id'], 
+                                "year": 2026, 
+                                "month": m, 
+                                "cost_actual": (r['cost_planned']/12)*random.uniform(0.9,1.1)
+                            })
+                        try:
+                            insert_bulk_actuals(a)
+                            st.success(f"Ist-Kosten für Monat {m} gebucht!"); time.sleep(1); st.rerun()
+                        except DB_ERRORS as e:
+                            st.error(f"Datenbank Fehler: {e}")
 
     # --- TAB 3: RESET ---
     with t3:
         st.warning("Achtung: Dies löscht alle Projekte, Finanzdaten und Ist-Werte!")
         if st.button("Alles unwiderruflich löschen"): 
-            delete_all_projects()
-            delete_all_stats()
-            delete_all_actuals()
-            st.success("Datenbank geleert."); time.sleep(1); st.rerun()
+            try:
+                delete_all_projects()
+                delete_all_stats()
+                delete_all_actuals()
+                st.success("Datenbank geleert."); time.sleep(1); st.rerun()
+            except DB_ERRORS as e:
+                st.error(f"Datenbank Fehler: {e}")
 
     # --- TAB 4: KATEGORIEN (NEU & DEBUGGED) ---
     with t4:
@@ -524,9 +554,12 @@ elif selected == "Administration":
             new_name = st.text_input("Neue Kategorie anlegen")
             if st.form_submit_button("Speichern"):
                 if new_name:
-                    insert_category(new_name)
-                    st.success(f"Gespeichert: {new_name}")
-                    time.sleep(0.5); st.rerun()
+                    try:
+                        insert_category(new_name)
+                        st.success(f"Gespeichert: {new_name}")
+                        time.sleep(0.5); st.rerun()
+                    except DB_ERRORS as e:
+                        st.error(f"Datenbank Fehler: {e}")
                 else:
                     st.error("Bitte einen Namen eingeben.")
 
@@ -574,15 +607,21 @@ elif selected == "Administration":
                             if st.button("💾 Speichern", key=f"save_{cat_id}"):
                                 if new_name and new_name != cat_name:
                                     # Hier wird die neue Update-Funktion aufgerufen
-                                    update_category(cat_id, new_name)
-                                    st.success("Gespeichert!")
-                                    time.sleep(0.5)
-                                    st.rerun()
+                                    try:
+                                        update_category(cat_id, new_name)
+                                        st.success("Gespeichert!")
+                                        time.sleep(0.5)
+                                        st.rerun()
+                                    except DB_ERRORS as e:
+                                        st.error(f"Datenbank Fehler: {e}")
 
                         # 3. Spalte: Löschen (Ihr alter Code, verschoben nach c3)
                         if c3.button("🗑️", key=f"del_{cat_id}", help="Löschen"):
-                            delete_category(cat_id)
-                            st.rerun()
+                            try:
+                                delete_category(cat_id)
+                                st.rerun()
+                            except DB_ERRORS as e:
+                                st.error(f"Datenbank Fehler: {e}")
                 
                 # --- FALL B: FEHLERHAFTE DATEN (Nur zur Sicherheit drin lassen) ---
                 elif isinstance(cat, str):
@@ -590,3 +629,74 @@ elif selected == "Administration":
 
         else:
             st.info("Keine Kategorien vorhanden.")
+
+    # --- TAB 5: EXPORT ---
+    with t5:
+        st.subheader("Daten exportieren")
+        st.caption("Die Daten werden seitenweise aus der Datenbank gelesen und direkt in die Datei geschrieben.")
+
+        with st.form("export_form"):
+            c1, c2 = st.columns(2)
+            ds = c1.selectbox("Datensatz", EXPORT_DATASETS)
+            fmt = c2.selectbox("Format", list(EXPORT_FORMATS.keys()))
+
+            # Filter-Optionen aus den bereits geladenen Daten
+            scen_opts = sorted(df_proj['scenario'].dropna().unique()) if not df_proj.empty else []
+            year_opts = sorted(df_proj['year'].dropna().unique(), reverse=True) if not df_proj.empty else []
+            cat_opts = sorted(df_proj['category'].dropna().unique()) if not df_proj.empty else []
+
+            f1, f2, f3 = st.columns(3)
+            f_scen = f1.selectbox("Szenario", ["Alle"] + list(scen_opts))
+            f_year = f2.selectbox("Jahr", ["Alle"] + [int(y) for y in year_opts])
+            f_cat = f3.selectbox("Kategorie", ["Alle"] + list(cat_opts))
+
+            if st.form_submit_button("📦 Export erzeugen"):
+                # Alte Datei aufräumen, damit sich nichts im Export-Ordner sammelt
+                remove_export(st.session_state.get('export_file'))
+                st.session_state.pop('export_file', None)
+                try:
+                    name, rows = write_export(
+                        ds, fmt,
+                        scenario=None if f_scen == "Alle" else f_scen,
+                        year=None if f_year == "Alle" else f_year,
+                        category=None if f_cat == "Alle" else f_cat,
+                    )
+                    if name is None:
+                        st.info("Keine Daten für diese Filter gefunden.")
+                    st.session_state.export_file = name
+                    st.session_state.export_rows = rows
+                except Exception as e:
+                    st.error(f"Export Fehler: {e}")
+
+        # Download über Static Serving: die Datei wird von der Platte gestreamt
+        # und nicht in den Speicher von Streamlit geladen
+        name = st.session_state.get('export_file')
+        if name and export_exists(name):
+            st.success(f"{st.session_state.export_rows} Zeilen exportiert.")
+            suffix = name[name.rindex("."):]
+            st.markdown(f'<a href="{export_url(name)}" download="cio_export{suffix}">⬇️ Datei herunterladen</a>', unsafe_allow_html=True)
+            st.caption("Der Link ist eine Stunde gültig.")
+        elif name:
+            st.session_state.pop('export_file', None)
+            st.info("Die Export-Datei ist abgelaufen. Bitte neu erzeugen.")
+
+    # --- TAB 6: VERBINDUNG (METRIKEN) ---
+    with t6:
+        st.subheader("Datenbank-Verbindung")
+        st.caption("Werte seit Prozessstart. 'Max. parallel' nahe an der Pool-Größe heißt: Pool vergrößern (DB_POOL_SIZE in secrets).")
+        mtr = get_metrics()
+
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Pool-Größe", mtr["pool_size"], f"{mtr['keepalive']} keep-alive", delta_color="off")
+        c2.metric("Max. parallel", mtr["peak_in_flight"], f"{mtr['in_flight']} aktiv", delta_color="off")
+        c3.metric("Ø Latenz", f"{mtr['latency_avg_ms']} ms", f"max {mtr['latency_max_ms']} ms", delta_color="off")
+        c4.metric("Circuit Breaker", "OFFEN" if mtr["breaker_open"] else "zu")
+
+        c5, c6, c7, c8 = st.columns(4)
+        c5.metric("Requests", mtr["requests"])
+        c6.metric("Fehler", mtr["failures"])
+        c7.metric("Retries", mtr["retries"])
+        c8.metric("Cache-Fallbacks", mtr["fallbacks"])
+
+        with st.expander("Rohdaten"):
+            st.json(mtr)
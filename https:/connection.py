@@ -0,0 +1,298 @@
+import random
+import threading
+import time
+
+import httpx
+import streamlit as st
+from postgrest.exceptions import APIError
+from supabase import ClientOptions, create_client
+
+# --- VERBINDUNGS-SCHICHT ---
+# Ein gemeinsamer HTTP-Pool (keep-alive) für alle Sessions, Timeouts pro
+# Request, Retries mit Jitter nur für Lese-Abfragen und ein Circuit Breaker.
+# Scheitert eine Lese-Abfrage (oder ist der Breaker offen), gibt es die letzten
+# guten Daten; die App erfährt das über served_stale_data().
+
+DEFAULTS = {
+    "DB_POOL_SIZE": 10,           # max. gleichzeitige Verbindungen
+    "DB_KEEPALIVE": 5,            # davon offen gehaltene Verbindungen
+    "DB_KEEPALIVE_EXPIRY": 30.0,  # Sekunden bis eine freie Verbindung geschlossen wird
+    "DB_CONNECT_TIMEOUT": 3.0,
+    "DB_READ_TIMEOUT": 5.0,
+    "DB_WRITE_TIMEOUT": 120.0,    # Bulk-Inserts/Deletes brauchen länger (postgrest-Default)
+    "DB_RETRIES": 3,              # Versuche gesamt (nur Lesen)
+    "DB_BACKOFF_BASE": 0.2,
+    "DB_BACKOFF_MAX": 2.0,
+    "DB_LATENCY_BUDGET": 6.0,     # Sekunden für alle Versuche einer Lese-Abfrage zusammen
+    "DB_BREAKER_THRESHOLD": 5,    # transiente Fehler in Folge bis der Breaker öffnet
+    "DB_BREAKER_COOLDOWN": 30.0,  # Sekunden bis zum nächsten Probe-Request
+}
+
+# Fehler, bei denen ein neuer Versuch sinnvoll ist (DB/Netz kurz weg), im
+# Gegensatz zu z.B. Unique- oder Foreign-Key-Verletzungen.
+TRANSIENT_HTTP_STATUS = {429, 502, 503, 504}
+# PostgREST: PGRST000-003 = keine DB-Verbindung / Pool-Timeout (503/504)
+TRANSIENT_PGRST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+# SQLSTATE: Serialisierung, Deadlock, zu viele Verbindungen, DB-Neustart
+# (dazu alle Verbindungsfehler der Klasse 08)
+TRANSIENT_SQLSTATES = {"40001", "40P01", "53300", "57P01", "57P02", "57P03"}
+
+
+class DatabaseUnavailable(Exception):
+    """DB nicht erreichbar und keine zwischengespeicherten Daten vorhanden"""
+
+
+# Alles, was die App als "Datenbank Fehler" anzeigen soll statt abzustürzen
+DB_ERRORS = (DatabaseUnavailable, httpx.HTTPError, APIError, RuntimeError)
+
+
+def get_setting(name):
+    """Liest eine Einstellung aus st.secrets, sonst Default"""
+    default = DEFAULTS[name]
+    try:
+        return type(default)(st.secrets.get(name, default))
+    except Exception:
+        return default
+
+
+# --- METRIKEN & BREAKER ---
+class ConnectionState:
+    """Prozessweiter Zustand: Metriken, Breaker und letzte gute Daten"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.fallbacks = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.last_good = {}
+
+    def acquire(self):
+        """
+        Fragt den Breaker, ob ein Request raus darf. Gibt (erlaubt, probe) zurück.
+        Nach dem Cooldown (halb-offen) darf genau EIN Probe-Request durch,
+        alle anderen warten weiter auf dessen Ergebnis.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                allowed, probe = True, False
+            elif self.probe_in_flight or time.monotonic() - self.opened_at < get_setting("DB_BREAKER_COOLDOWN"):
+                return False, False
+            else:
+                self.probe_in_flight = True
+                allowed, probe = True, True
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return allowed, probe
+
+    def finish(self, elapsed, outcome, probe):
+        """outcome: 'ok', 'transient' (zählt für den Breaker) oder 'error' (nur Metrik)"""
+        with self.lock:
+            self.in_flight -= 1
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+            if probe:
+                self.probe_in_flight = False
+            if outcome == "ok":
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if outcome == "transient":
+                self.consecutive_failures += 1
+                # Probe fehlgeschlagen -> sofort wieder für einen Cooldown zu
+                if probe or self.consecutive_failures >= get_setting("DB_BREAKER_THRESHOLD"):
+                    self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self.lock:
+            done = self.requests - self.in_flight
+            return {
+                "pool_size": get_setting("DB_POOL_SIZE"),
+                "keepalive": get_setting("DB_KEEPALIVE"),
+                "requests": self.requests,
+                "failures": self.failures,
+                "retries": self.retries,
+                "fallbacks": self.fallbacks,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "latency_avg_ms": round(self.latency_total / done * 1000, 1) if done else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 1),
+                "breaker_open": self.opened_at is not None,
+                "probe_in_flight": self.probe_in_flight,
+                "cached_keys": len(self.last_good),
+            }
+
+
+@st.cache_resource
+def get_state():
+    return ConnectionState()
+
+def get_metrics():
+    """Verbindungs-Metriken zum Dimensionieren des Pools"""
+    return get_state().snapshot()
+
+
+# --- CLIENT ---
+# Zustand des laufenden Skript-Durchlaufs: Frist der Lese-Abfrage, Schreib-
+# Modus und ob alte Daten geliefert wurden. Streamlit führt jede Session in
+# einem eigenen Thread aus, daher thread-lokal.
+_local = threading.local()
+
+def reset_stale_flag():
+    """Zu Beginn eines Durchlaufs aufrufen"""
+    _local.stale = False
+
+def served_stale_data():
+    """True, wenn in diesem Durchlauf zwischengespeicherte Daten geliefert wurden"""
+    return getattr(_local, "stale", False)
+
+def _apply_timeout(request):
+    """httpx-Hook: Lesen auf das restliche Latenz-Budget kürzen, Schreiben mit eigenem Timeout"""
+    connect = get_setting("DB_CONNECT_TIMEOUT")
+    deadline = getattr(_local, "deadline", None)
+    if deadline is not None:
+        remaining = max(deadline - time.monotonic(), 0.001)
+        timeout = httpx.Timeout(min(get_setting("DB_READ_TIMEOUT"), remaining), connect=min(connect, remaining))
+    elif getattr(_local, "write", False):
+        timeout = httpx.Timeout(get_setting("DB_WRITE_TIMEOUT"), connect=connect)
+    else:
+        return
+    request.extensions["timeout"] = timeout.as_dict()
+
+def _raise_transient_status(response):
+    """httpx-Hook: 429/502/503/504 als HTTPStatusError, egal ob der Body JSON ist"""
+    if response.status_code in TRANSIENT_HTTP_STATUS:
+        response.read()
+        response.raise_for_status()
+
+def _build_http_client():
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=get_setting("DB_POOL_SIZE"),
+            max_keepalive_connections=get_setting("DB_KEEPALIVE"),
+            keepalive_expiry=get_setting("DB_KEEPALIVE_EXPIRY"),
+        ),
+        timeout=httpx.Timeout(get_setting("DB_READ_TIMEOUT"), connect=get_setting("DB_CONNECT_TIMEOUT")),
+        event_hooks={"request": [_apply_timeout], "response": [_raise_transient_status]},
+    )
+
+def _close_client(client):
+    """
+    Wird bei st.cache_resource.clear() aufgerufen: Pool sauber schließen.
+    Laufende Requests anderer Sessions scheitern dann mit RuntimeError, das
+    wird als transient behandelt und mit dem neuen Client wiederholt.
+    """
+    client.options.httpx_client.close()
+
+@st.cache_resource(on_release=_close_client)
+def get_client():
+    url = st.secrets["SUPABASE_URL"]
+    key = st.secrets["SUPABASE_KEY"]
+    return create_client(url, key, options=ClientOptions(httpx_client=_build_http_client()))
+
+
+# --- AUSFÜHRUNG ---
+def _is_transient(err):
+    """Nur Netzwerk-/Verbindungsfehler lohnen einen neuen Versuch"""
+    if isinstance(err, httpx.TransportError):
+        return True
+    if isinstance(err, RuntimeError):
+        # Pool wurde über "Cache leeren" geschlossen, der nächste Versuch nimmt den neuen
+        return "client has been closed" in str(err)
+    if isinstance(err, httpx.HTTPStatusError):
+        return err.response.status_code in TRANSIENT_HTTP_STATUS
+    if isinstance(err, APIError):
+        code = err.code
+        # Kein JSON im Body: postgrest setzt dann den HTTP-Status als code
+        if isinstance(code, int) or (isinstance(code, str) and len(code) == 3 and code.isdigit()):
+            return int(code) in TRANSIENT_HTTP_STATUS
+        code = str(code or "")
+        return code in TRANSIENT_PGRST_CODES or code in TRANSIENT_SQLSTATES or (len(code) == 5 and code.startswith("08"))
+    return False
+
+def _execute(state, build_query, probe):
+    t0 = time.monotonic()
+    try:
+        # Eingebaute postgrest-Retries aus, die Retries macht run_read
+        result = build_query(get_client()).retry(False).execute()
+    except Exception as e:
+        state.finish(time.monotonic() - t0, "transient" if _is_transient(e) else "error", probe)
+        raise
+    state.finish(time.monotonic() - t0, "ok", probe)
+    return result
+
+def run_read(build_query, cache_key=None, allow_stale=True):
+    """
+    Führt eine Lese-Abfrage aus (idempotent): Retries mit Jitter innerhalb des
+    Latenz-Budgets, jeder Versuch bekommt nur das restliche Budget als Timeout.
+    Scheitern alle Versuche transient oder ist der Breaker offen, werden mit
+    cache_key die letzten guten Daten geliefert und served_stale_data() ist
+    True (allow_stale=False z.B. vor dem Schreiben). Gibt response.data zurück.
+    """
+    state = get_state()
+    deadline = time.monotonic() + get_setting("DB_LATENCY_BUDGET")
+    connect_timeout = get_setting("DB_CONNECT_TIMEOUT")
+    attempts = get_setting("DB_RETRIES")
+    error = None
+
+    _local.deadline = deadline
+    try:
+        for attempt in range(attempts):
+            # Reicht das Budget nicht mal für den Verbindungsaufbau, gar nicht erst versuchen
+            if attempt > 0 and deadline - time.monotonic() < connect_timeout:
+                break
+            allowed, probe = state.acquire()
+            if not allowed:
+                break
+            try:
+                data = _execute(state, build_query, probe).data
+            except Exception as e:
+                if not _is_transient(e):
+                    raise
+                error = e
+                # Full Jitter: zufällige Pause bis zum exponentiellen Maximum
+                pause = random.uniform(0, min(get_setting("DB_BACKOFF_MAX"), get_setting("DB_BACKOFF_BASE") * 2 ** attempt))
+                if attempt == attempts - 1 or time.monotonic() + pause + connect_timeout >= deadline:
+                    break
+                with state.lock:
+                    state.retries += 1
+                time.sleep(pause)
+                continue
+            if cache_key is not None:
+                with state.lock:
+                    state.last_good[cache_key] = data
+            return data
+    finally:
+        _local.deadline = None
+
+    # Nur transiente Fehler oder offener Breaker landen hier
+    if allow_stale and cache_key is not None:
+        with state.lock:
+            if cache_key in state.last_good:
+                state.fallbacks += 1
+                _local.stale = True
+                return state.last_good[cache_key]
+    if error is not None:
+        raise error
+    raise DatabaseUnavailable("Datenbank nicht erreichbar (Circuit Breaker offen)")
+
+def run_write(build_query):
+    """Führt eine schreibende Abfrage aus. Kein Retry, da nicht idempotent."""
+    state = get_state()
+    allowed, probe = state.acquire()
+    if not allowed:
+        raise DatabaseUnavailable("Datenbank nicht erreichbar (Circuit Breaker offen)")
+    _local.write = True
+    try:
+        return _execute(state, build_query, probe)
+    finally:
+        _local.write = False
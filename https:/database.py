@@ -1,84 +1,90 @@
-import streamlit as st
-from supabase import create_client, Client
+from connection import get_client, run_read, run_write
 
-@st.cache_resource
 def init_connection():
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_KEY"]
-    return create_client(url, key)
+    """Gemeinsamer Client (Pool, Timeouts) aus connection.py"""
+    return get_client()
 
 # --- PROJEKTE (PLAN) ---
 def insert_bulk_projects(data_list):
-    supabase = init_connection()
-    return supabase.table("digital_projects").insert(data_list).execute()
+    return run_write(lambda db: db.table("digital_projects").insert(data_list))
 
-def get_projects():
-    supabase = init_connection()
-    return supabase.table("digital_projects").select("*").execute().data
+def get_projects(allow_stale=True):
+    """allow_stale=False, wenn mit dem Ergebnis geschrieben wird (keine alten IDs)"""
+    return run_read(lambda db: db.table("digital_projects").select("*"), cache_key="digital_projects", allow_stale=allow_stale)
 
 def delete_all_projects():
-    supabase = init_connection()
-    return supabase.table("digital_projects").delete().neq("id", 0).execute()
+    return run_write(lambda db: db.table("digital_projects").delete().neq("id", 0))
 
 # --- STATS (FTE/Umsatz) ---
 def insert_bulk_stats(data_list):
-    supabase = init_connection()
-    return supabase.table("company_stats").insert(data_list).execute()
+    return run_write(lambda db: db.table("company_stats").insert(data_list))
 
 def get_stats():
-    supabase = init_connection()
-    return supabase.table("company_stats").select("*").execute().data
+    return run_read(lambda db: db.table("company_stats").select("*"), cache_key="company_stats")
 
 def delete_all_stats():
-    supabase = init_connection()
-    return supabase.table("company_stats").delete().neq("id", 0).execute()
+    return run_write(lambda db: db.table("company_stats").delete().neq("id", 0))
 
 # --- NEU: ACTUALS (IST-KOSTEN) ---
 def insert_bulk_actuals(data_list):
-    supabase = init_connection()
-    return supabase.table("project_actuals").insert(data_list).execute()
+    return run_write(lambda db: db.table("project_actuals").insert(data_list))
 
 def get_actuals():
-    supabase = init_connection()
-    return supabase.table("project_actuals").select("*").execute().data
+    return run_read(lambda db: db.table("project_actuals").select("*"), cache_key="project_actuals")
 
 def delete_all_actuals():
-    supabase = init_connection()
-    return supabase.table("project_actuals").delete().neq("id", 0).execute()
+    return run_write(lambda db: db.table("project_actuals").delete().neq("id", 0))
 
 # --- HIER BEGINNT DER KORRIGIERTE ABSCHNITT FÜR DATABASE.PY ---
 
 def insert_category(name_text):
     """Fügt eine neue Kategorie hinzu"""
-    supabase = init_connection()
-    supabase.table('project_categories').insert({"name": name_text}).execute()
+    run_write(lambda db: db.table('project_categories').insert({"name": name_text}))
 
 def delete_category(cat_id):
     """Löscht eine Kategorie anhand der ID"""
-    supabase = init_connection()
-    supabase.table('project_categories').delete().eq('id', cat_id).execute()
+    run_write(lambda db: db.table('project_categories').delete().eq('id', cat_id))
 
 def update_category(cat_id, new_name):
     """Aktualisiert den Namen einer Kategorie"""
-    supabase = init_connection()
-    supabase.table('project_categories').update({"name": new_name}).eq('id', cat_id).execute()
+    run_write(lambda db: db.table('project_categories').update({"name": new_name}).eq('id', cat_id))
 
 def get_actuals():
     """Holt die Ist-Kosten (Actuals)"""
-    supabase = init_connection()
-    response = supabase.table('project_actuals').select('*').execute()
-    return response.data
+    return run_read(lambda db: db.table('project_actuals').select('*'), cache_key="project_actuals")
 
 # WICHTIG: Das ist die EINZIGE get_categories Funktion, die wir behalten!
 # Kein @st.cache_data verwenden, damit Änderungen sofort sichtbar sind.
 def get_categories():
     """Holt alle Kategorien inkl. IDs"""
-    supabase = init_connection()
     # Wir brauchen ALLES (*) -> ID und Name
-    response = supabase.table('project_categories').select('*').order('name').execute()
+    data = run_read(lambda db: db.table('project_categories').select('*').order('name'), cache_key="project_categories")
     
     # Wir geben die ROHDATEN zurück (Liste von Dictionaries: [{'id':1, 'name':'IT'}, ...])
-    data = response.data
     if data is None: 
         return []
     return data
+
+# --- EXPORT: SEITENWEISES LESEN ---
+# PostgREST liefert pro Request nur einen Ausschnitt (range). So bleibt der
+# Speicherbedarf pro Seite begrenzt, egal wie groß die Tabelle ist.
+EXPORT_PAGE_SIZE = 1000
+
+def iter_table_pages(table_name, columns="*", filters=None, page_size=EXPORT_PAGE_SIZE):
+    """Liefert eine Tabelle Seite für Seite (Liste von Dictionaries pro Seite)"""
+    def build_page(db, start):
+        query = db.table(table_name).select(columns)
+        for col, val in (filters or {}).items():
+            query = query.eq(col, val)
+        # Stabile Sortierung, sonst können Seiten Zeilen doppelt/gar nicht liefern
+        return query.order("id").range(start, start + page_size - 1)
+
+    start = 0
+    while True:
+        # Kein cache_key: Export-Seiten sollen nicht im Speicher liegen bleiben
+        rows = run_read(lambda db: build_page(db, start))
+        if not rows:
+            break
+        yield rows
+        # Bis eine leere Seite kommt: max-rows im Projekt kann Seiten kürzen
+        start += len(rows)
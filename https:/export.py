@@ -0,0 +1,245 @@
+import csv
+import os
+import secrets
+import time
+
+from database import iter_table_pages
+
+# --- EXPORT (CSV / PARQUET / XLSX) ---
+# Die Daten werden Seite für Seite aus Supabase gelesen und direkt in eine
+# Datei geschrieben. Es liegt nie die ganze Tabelle als DataFrame im
+# Streamlit-Prozess. Ausgeliefert wird die Datei über Streamlits Static
+# Serving (server.enableStaticServing) direkt von der Platte.
+
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORT_URL = "app/static/exports"
+EXPORT_TTL = 3600  # Sekunden, danach werden Export-Dateien gelöscht
+# Streamlit liefert größere Static-Dateien nicht aus (404)
+EXPORT_MAX_BYTES = 200 * 1024 * 1024
+
+EXPORT_FORMATS = {"CSV": ".csv", "Parquet": ".parquet", "XLSX": ".xlsx"}
+
+DS_PROJECTS = "Projekte (Plan & Historie)"
+DS_ACTUALS = "Ist-Kosten"
+DS_AGG_PLAN = "Aggregat: Plan je Kategorie"
+DS_AGG_ACTUAL = "Aggregat: Ist je Kategorie"
+DS_AGG_SCENARIO = "Aggregat: Szenario-Summen"
+
+EXPORT_DATASETS = [DS_PROJECTS, DS_ACTUALS, DS_AGG_PLAN, DS_AGG_ACTUAL, DS_AGG_SCENARIO]
+
+
+# --- HELPER ---
+def _to_float(value):
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def _project_filters(scenario=None, year=None, category=None):
+    filters = {}
+    if scenario: filters["scenario"] = scenario
+    if year: filters["year"] = year
+    if category: filters["category"] = category
+    return filters
+
+
+# --- ROHDATEN ---
+def _iter_projects(scenario=None, year=None, category=None):
+    return iter_table_pages("digital_projects", filters=_project_filters(scenario, year, category))
+
+def _flatten_project(row):
+    """Eingebettetes Projekt ({'digital_projects': {...}}) zu eigenen Spalten machen"""
+    proj = row.pop("digital_projects", None) or {}
+    row["scenario"] = proj.get("scenario")
+    row["category"] = proj.get("category")
+    return row
+
+def _iter_actuals(scenario=None, year=None, category=None):
+    """Ist-Kosten, ergänzt um Szenario & Kategorie des gebuchten Projekts"""
+    # Join über den Foreign Key project_id; gefiltert wird in der DB.
+    # !inner nur mit Projekt-Filter, sonst fielen Ist-Kosten ohne Projekt raus.
+    filters = {"year": year} if year else {}
+    if scenario: filters["digital_projects.scenario"] = scenario
+    if category: filters["digital_projects.category"] = category
+    embed = "digital_projects!inner" if (scenario or category) else "digital_projects"
+    for page in iter_table_pages("project_actuals", columns=f"*, {embed}(scenario, category)", filters=filters):
+        yield [_flatten_project(row) for row in page]
+
+
+# --- AGGREGATE (wie die Group-Bys im Dashboard) ---
+# Es werden nur die Summen je Gruppe gehalten, nicht die Einzelzeilen.
+def _aggregate(pages, keys, value_col):
+    sums = {}
+    for page in pages:
+        for row in page:
+            k = tuple(row.get(c) for c in keys)
+            total, count = sums.get(k, (0.0, 0))
+            sums[k] = (total + _to_float(row.get(value_col)), count + 1)
+    rows = []
+    for k in sorted(sums, key=lambda t: tuple("" if v is None else str(v) for v in t)):
+        total, count = sums[k]
+        row = dict(zip(keys, k))
+        row[value_col] = round(total, 2)
+        row["anzahl"] = count
+        rows.append(row)
+    if rows:
+        yield rows
+
+def iter_export_pages(dataset, scenario=None, year=None, category=None):
+    """Liefert die Export-Seiten für einen Datensatz inkl. Filter"""
+    if dataset == DS_PROJECTS:
+        return _iter_projects(scenario, year, category)
+    if dataset == DS_ACTUALS:
+        return _iter_actuals(scenario, year, category)
+    if dataset == DS_AGG_PLAN:
+        return _aggregate(_iter_projects(scenario, year, category), ["scenario", "year", "category"], "cost_planned")
+    if dataset == DS_AGG_ACTUAL:
+        return _aggregate(_iter_actuals(scenario, year, category), ["year", "category"], "cost_actual")
+    if dataset == DS_AGG_SCENARIO:
+        return _aggregate(_iter_projects(scenario, year, category), ["scenario", "year"], "cost_planned")
+    raise ValueError(f"Unbekannter Datensatz: {dataset}")
+
+
+# --- WRITER ---
+def _write_csv(pages, path):
+    rows_written = 0
+    # Standard-CSV (Komma, Dezimalpunkt). Für Excel gibt es den XLSX-Export.
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        for page in pages:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(page[0].keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerows(page)
+            rows_written += len(page)
+    return rows_written
+
+# Feste Typen für bekannte Spalten, damit jeder Export dasselbe Schema hat.
+# PostgREST liefert 1234.0 als 1234, daher Beträge immer float64.
+# Unbekannte Spalten werden als Text geschrieben.
+INT_COLUMNS = {"id", "project_id", "year", "month", "fte_count", "anzahl"}
+FLOAT_COLUMNS = {"cost_planned", "cost_actual", "revenue", "risk_factor", "strategic_score"}
+
+def _parquet_schema(columns):
+    import pyarrow as pa
+
+    fields = []
+    for col in columns:
+        if col in INT_COLUMNS: typ = pa.int64()
+        elif col in FLOAT_COLUMNS: typ = pa.float64()
+        else: typ = pa.string()
+        fields.append(pa.field(col, typ))
+    return pa.schema(fields)
+
+def _to_int(value):
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"Keine Ganzzahl: {value}")
+    return int(number)
+
+def _cast_page(page, schema):
+    """Bringt die Werte einer Seite auf das feste Schema"""
+    import pyarrow as pa
+
+    columns = {}
+    for field in schema:
+        values = [row.get(field.name) for row in page]
+        if field.type == pa.int64():
+            values = [None if v is None else _to_int(v) for v in values]
+        elif field.type == pa.float64():
+            values = [None if v is None else float(v) for v in values]
+        else:
+            values = [None if v is None else str(v) for v in values]
+        columns[field.name] = values
+    return pa.Table.from_pydict(columns, schema=schema)
+
+def _write_parquet(pages, path):
+    import pyarrow.parquet as pq
+
+    rows_written = 0
+    writer = None
+    try:
+        for page in pages:
+            if writer is None:
+                writer = pq.ParquetWriter(path, _parquet_schema(page[0].keys()))
+            writer.write_table(_cast_page(page, writer.schema))
+            rows_written += len(page)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_written
+
+def _write_xlsx(pages, path):
+    from openpyxl import Workbook
+
+    # write_only: Zeilen werden direkt rausgeschrieben statt im Workbook zu bleiben
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Export")
+    rows_written = 0
+    header = None
+    for page in pages:
+        if header is None:
+            header = list(page[0].keys())
+            ws.append(header)
+        for row in page:
+            ws.append([row.get(c) for c in header])
+        rows_written += len(page)
+    wb.save(path)
+    return rows_written
+
+_WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "XLSX": _write_xlsx}
+
+
+# --- DATEIEN ---
+def cleanup_exports(max_age=EXPORT_TTL):
+    """Löscht alte Export-Dateien (auch von Sessions, die längst beendet sind)"""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except FileNotFoundError:
+            pass  # parallel schon weggeräumt
+
+def write_export(dataset, fmt, scenario=None, year=None, category=None):
+    """
+    Schreibt den Export in den Static-Ordner. Gibt (Dateiname, Anzahl Zeilen)
+    zurück, bei 0 Treffern (None, 0).
+    """
+    cleanup_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    suffix = EXPORT_FORMATS[fmt]
+    # Nicht erratbarer Name, die Datei ist per URL ohne Login abrufbar
+    name = f"cio_export_{secrets.token_urlsafe(24)}{suffix}"
+    path = _export_path(name)
+    try:
+        rows = _WRITERS[fmt](iter_export_pages(dataset, scenario, year, category), path)
+    except Exception:
+        remove_export(name)
+        raise
+    if rows == 0:
+        remove_export(name)
+        return None, 0
+    if os.path.getsize(path) > EXPORT_MAX_BYTES:
+        remove_export(name)
+        raise ValueError(f"Export größer als {EXPORT_MAX_BYTES // (1024 * 1024)} MB, bitte weiter filtern (Szenario, Jahr, Kategorie).")
+    return name, rows
+
+def _export_path(name):
+    return os.path.join(EXPORT_DIR, os.path.basename(name))
+
+def export_exists(name):
+    """False, wenn die Datei inzwischen weggeräumt wurde"""
+    return bool(name) and os.path.exists(_export_path(name))
+
+def export_url(name):
+    """Relativer Link, den Streamlit direkt von der Platte ausliefert"""
+    return f"{EXPORT_URL}/{name}"
+
+def remove_export(name):
+    """Räumt eine alte Export-Datei weg"""
+    if export_exists(name):
+        os.remove(_export_path(name))
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import httpx
+import pytest
+from supabase import ClientOptions, create_client
+
+# Die App-Module liegen eine Ebene höher (kein Paket)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+
+@pytest.fixture
+def state(monkeypatch):
+    """Frischer Verbindungs-Zustand statt des prozessweiten Caches"""
+    fresh = connection.ConnectionState()
+    monkeypatch.setattr(connection, "get_state", lambda: fresh)
+    return fresh
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Einstellungen überschreiben, z.B. settings['DB_BACKOFF_BASE'] = 0.001"""
+    overrides = {"DB_BACKOFF_BASE": 0.001}
+    defaults = connection.DEFAULTS
+    monkeypatch.setattr(connection, "get_setting", lambda name: overrides.get(name, defaults[name]))
+    return overrides
+
+
+@pytest.fixture
+def mock_db(monkeypatch, state, settings):
+    """
+    Echter supabase-Client auf einem httpx.MockTransport. Aufruf mit einem
+    Handler (request -> httpx.Response); gibt die Liste der Requests zurück.
+    """
+    def install(handler):
+        requests = []
+
+        def record(request):
+            requests.append(request)
+            return handler(request)
+
+        http = httpx.Client(
+            transport=httpx.MockTransport(record),
+            event_hooks={"request": [connection._apply_timeout], "response": [connection._raise_transient_status]},
+        )
+        client = create_client("http://supabase.test", "x" * 40, options=ClientOptions(httpx_client=http))
+        monkeypatch.setattr(connection, "get_client", lambda: client)
+        return requests
+
+    return install
@@ -0,0 +1,252 @@
+import threading
+import time
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from supabase import ClientOptions, create_client
+
+import connection
+from connection import ConnectionState, DatabaseUnavailable
+
+
+def query(db):
+    return db.table("digital_projects").select("*")
+
+
+def responses(*items):
+    """Handler, der die Antworten der Reihe nach liefert (die letzte wiederholt)"""
+    items = list(items)
+
+    def handler(request):
+        item = items.pop(0) if len(items) > 1 else items[0]
+        if isinstance(item, Exception):
+            raise item
+        status, body = item
+        return httpx.Response(status, json=body)
+    return handler
+
+
+@pytest.fixture(autouse=True)
+def clean_local():
+    connection.reset_stale_flag()
+    yield
+    connection.reset_stale_flag()
+
+
+# --- KLASSIFIZIERUNG ---
+@pytest.mark.parametrize("err, expected", [
+    (httpx.ConnectError("weg"), True),
+    (httpx.ReadTimeout("langsam"), True),
+    (APIError({"code": "PGRST001"}), True),
+    (APIError({"code": "PGRST003"}), True),
+    (APIError({"code": "08006"}), True),
+    (APIError({"code": "40P01"}), True),
+    (APIError({"code": "57P03"}), True),
+    (APIError({"code": 503}), True),       # Body ohne JSON: code = HTTP-Status
+    (APIError({"code": "429"}), True),
+    (APIError({"code": 400}), False),
+    (APIError({"code": "23505"}), False),  # Unique-Verletzung
+    (APIError({"code": "23503"}), False),  # Foreign Key
+    (APIError({"code": "57014"}), False),  # Statement-Timeout
+    (APIError({"code": "PGRST116"}), False),
+    (RuntimeError("Cannot send a request, as the client has been closed."), True),
+    (RuntimeError("anderer Fehler"), False),
+    (ValueError("x"), False),
+])
+def test_is_transient(err, expected):
+    assert connection._is_transient(err) is expected
+
+
+@pytest.mark.parametrize("status, expected", [(429, True), (502, True), (503, True), (504, True), (500, False), (409, False)])
+def test_is_transient_http_status(status, expected):
+    request = httpx.Request("GET", "http://supabase.test")
+    err = httpx.HTTPStatusError("x", request=request, response=httpx.Response(status, request=request))
+    assert connection._is_transient(err) is expected
+
+
+# --- BREAKER ---
+def test_breaker_opens_after_threshold_of_transient_failures(settings):
+    state = ConnectionState()
+    for _ in range(connection.DEFAULTS["DB_BREAKER_THRESHOLD"]):
+        assert state.acquire() == (True, False)
+        state.finish(0.01, "transient", False)
+
+    assert state.acquire() == (False, False)
+    assert state.snapshot()["breaker_open"]
+
+
+def test_non_transient_errors_do_not_open_breaker(settings):
+    state = ConnectionState()
+    for _ in range(10):
+        state.acquire()
+        state.finish(0.01, "error", False)
+
+    assert state.acquire() == (True, False)
+    assert state.snapshot()["failures"] == 10
+
+
+def test_success_resets_failure_count(settings):
+    state = ConnectionState()
+    for outcome in ["transient"] * 4 + ["ok"] + ["transient"] * 4:
+        state.acquire()
+        state.finish(0.01, outcome, False)
+
+    assert not state.snapshot()["breaker_open"]
+
+
+def test_half_open_lets_exactly_one_probe_through(settings):
+    settings["DB_BREAKER_COOLDOWN"] = 0.0
+    state = ConnectionState()
+    state.opened_at = time.monotonic()
+
+    assert state.acquire() == (True, True)
+    assert state.acquire() == (False, False)
+
+    state.finish(0.01, "ok", True)
+    assert state.acquire() == (True, False)
+
+
+def test_failed_probe_reopens_breaker(settings):
+    settings["DB_BREAKER_COOLDOWN"] = 0.0
+    state = ConnectionState()
+    state.opened_at = time.monotonic() - 10
+
+    state.acquire()
+    state.finish(0.01, "transient", True)
+
+    assert state.snapshot()["breaker_open"]
+    assert not state.probe_in_flight
+
+
+def test_metrics_track_concurrency_and_latency(settings):
+    state = ConnectionState()
+    state.acquire()
+    state.acquire()
+    state.finish(0.2, "ok", False)
+
+    m = state.snapshot()
+    assert (m["requests"], m["in_flight"], m["peak_in_flight"]) == (2, 1, 2)
+    assert m["latency_max_ms"] == 200.0
+
+
+# --- LESEN ---
+def test_read_retries_transient_errors(mock_db, state):
+    requests = mock_db(responses((503, {"code": "PGRST001"}), (200, [{"id": 1}])))
+
+    assert connection.run_read(query) == [{"id": 1}]
+    assert len(requests) == 2
+    assert state.retries == 1
+
+
+def test_read_does_not_retry_non_transient_errors(mock_db, state):
+    requests = mock_db(responses((409, {"code": "23505", "message": "dup", "hint": None, "details": None})))
+
+    with pytest.raises(APIError):
+        connection.run_read(query, cache_key="digital_projects")
+    assert len(requests) == 1
+    assert not connection.served_stale_data()
+
+
+def test_read_falls_back_to_last_good_data_on_first_outage(mock_db, state):
+    mock_db(responses((200, [{"id": 1}]), (503, {"code": "PGRST001"})))
+    connection.run_read(query, cache_key="digital_projects")
+
+    # Breaker noch zu, trotzdem alte Daten statt Fehler
+    assert connection.run_read(query, cache_key="digital_projects") == [{"id": 1}]
+    assert not state.snapshot()["breaker_open"]
+    assert connection.served_stale_data()
+    assert state.fallbacks == 1
+
+
+def test_read_without_stale_raises(mock_db, state):
+    mock_db(responses((200, [{"id": 1}]), (503, {"code": "PGRST001"})))
+    connection.run_read(query, cache_key="digital_projects")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        connection.run_read(query, cache_key="digital_projects", allow_stale=False)
+
+
+def test_read_with_open_breaker_and_no_cache_raises(mock_db, state):
+    requests = mock_db(responses((200, [])))
+    state.opened_at = time.monotonic()
+
+    with pytest.raises(DatabaseUnavailable):
+        connection.run_read(query)
+    assert requests == []
+
+
+def test_read_timeout_is_clamped_to_budget(mock_db, settings):
+    settings["DB_LATENCY_BUDGET"] = 1.5
+    requests = mock_db(responses((200, [])))
+
+    connection.run_read(query)
+
+    timeout = requests[0].extensions["timeout"]
+    assert 0 < timeout["read"] <= 1.5
+    assert timeout["connect"] <= 1.5
+
+
+def test_read_skips_retry_when_budget_below_connect_timeout(mock_db, settings):
+    settings["DB_LATENCY_BUDGET"] = 2.0  # < 3 s Verbindungsaufbau
+    requests = mock_db(responses(httpx.ConnectError("weg")))
+
+    with pytest.raises(httpx.ConnectError):
+        connection.run_read(query)
+    assert len(requests) == 1
+
+
+def test_read_retries_with_new_client_after_pool_was_closed(mock_db, monkeypatch):
+    mock_db(responses((200, [{"id": 1}])))
+    fresh = connection.get_client()
+    closed_http = httpx.Client()
+    closed_http.close()
+    closed = create_client("http://supabase.test", "x" * 40, options=ClientOptions(httpx_client=closed_http))
+    clients = [closed, fresh]
+    monkeypatch.setattr(connection, "get_client", lambda: clients.pop(0) if len(clients) > 1 else clients[0])
+
+    assert connection.run_read(query) == [{"id": 1}]
+
+
+def test_half_open_sends_single_probe_for_concurrent_reads(mock_db, state, settings):
+    settings["DB_BREAKER_COOLDOWN"] = 0.0
+    gate = threading.Event()
+
+    def slow(request):
+        gate.wait(1)
+        return httpx.Response(200, json=[{"id": 1}])
+    requests = mock_db(slow)
+    state.last_good["digital_projects"] = [{"id": 0}]
+    state.opened_at = time.monotonic() - 10
+
+    results = []
+    def worker():
+        results.append(connection.run_read(query, cache_key="digital_projects"))
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads: t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads: t.join()
+
+    assert len(requests) == 1
+    assert sorted(r[0]["id"] for r in results) == [0, 0, 0, 0, 1]
+
+
+# --- SCHREIBEN ---
+def test_write_uses_write_timeout_and_is_not_retried(mock_db, state):
+    requests = mock_db(responses((503, {"code": "PGRST001"})))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        connection.run_write(lambda db: db.table("digital_projects").insert({"a": 1}))
+
+    assert len(requests) == 1
+    assert requests[0].extensions["timeout"]["read"] == connection.DEFAULTS["DB_WRITE_TIMEOUT"]
+
+
+def test_write_with_open_breaker_raises(mock_db, state):
+    requests = mock_db(responses((201, [])))
+    state.opened_at = time.monotonic()
+
+    with pytest.raises(DatabaseUnavailable):
+        connection.run_write(lambda db: db.table("digital_projects").insert({"a": 1}))
+    assert requests == []
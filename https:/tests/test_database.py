@@ -0,0 +1,35 @@
+import httpx
+
+import database
+
+
+def _paged_handler(rows, max_rows):
+    """Simuliert PostgREST mit max-rows: Seiten werden ggf. gekürzt"""
+    def handler(request):
+        offset = int(request.url.params.get("offset", 0))
+        limit = min(int(request.url.params.get("limit", len(rows))), max_rows)
+        return httpx.Response(200, json=rows[offset:offset + limit])
+    return handler
+
+
+def test_iter_table_pages_reads_until_empty_page(mock_db):
+    rows = [{"id": i} for i in range(1, 9)]
+    requests = mock_db(_paged_handler(rows, max_rows=3))
+
+    pages = list(database.iter_table_pages("digital_projects", page_size=1000))
+
+    assert [len(p) for p in pages] == [3, 3, 2]
+    assert [r["id"] for p in pages for r in p] == list(range(1, 9))
+    # Letzter Request liefert die leere Seite
+    assert len(requests) == 4
+    assert [int(r.url.params["offset"]) for r in requests] == [0, 3, 6, 8]
+
+
+def test_iter_table_pages_applies_filters_and_order(mock_db):
+    requests = mock_db(lambda request: httpx.Response(200, json=[]))
+
+    assert list(database.iter_table_pages("digital_projects", filters={"year": 2026})) == []
+
+    params = requests[0].url.params
+    assert params["year"] == "eq.2026"
+    assert params["order"] == "id.asc"
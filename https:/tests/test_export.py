@@ -0,0 +1,144 @@
+import csv
+import os
+
+import httpx
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import export
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """Export-Seiten direkt vorgeben statt sie aus der DB zu lesen"""
+    def install(*page_list):
+        monkeypatch.setattr(export, "iter_export_pages", lambda *a, **k: iter(page_list))
+    return install
+
+
+# --- AGGREGATE ---
+def test_aggregate_sums_and_counts_per_group():
+    data = [
+        [{"scenario": "A", "category": "IT", "cost_planned": 10}, {"scenario": "A", "category": "IT", "cost_planned": "5.5"}],
+        [{"scenario": "A", "category": None, "cost_planned": None}, {"scenario": "B", "category": "IT", "cost_planned": 1}],
+    ]
+
+    (rows,) = list(export._aggregate(iter(data), ["scenario", "category"], "cost_planned"))
+
+    assert rows == [
+        {"scenario": "A", "category": None, "cost_planned": 0.0, "anzahl": 1},
+        {"scenario": "A", "category": "IT", "cost_planned": 15.5, "anzahl": 2},
+        {"scenario": "B", "category": "IT", "cost_planned": 1.0, "anzahl": 1},
+    ]
+
+
+def test_aggregate_without_rows_yields_nothing():
+    assert list(export._aggregate(iter([]), ["year"], "cost_actual")) == []
+
+
+# --- PARQUET ---
+def test_parquet_schema_is_pinned_for_known_columns():
+    schema = export._parquet_schema(["id", "year", "cost_planned", "risk_factor", "opex_type", "unbekannt"])
+
+    assert schema.types == [pa.int64(), pa.int64(), pa.float64(), pa.float64(), pa.string(), pa.string()]
+
+
+def test_cast_page_widens_and_stringifies():
+    schema = export._parquet_schema(["id", "cost_planned", "opex_type", "created_at"])
+
+    table = export._cast_page([{"id": 1, "cost_planned": 1000, "opex_type": None, "created_at": 5}], schema)
+
+    assert table.to_pylist() == [{"id": 1, "cost_planned": 1000.0, "opex_type": None, "created_at": "5"}]
+
+
+def test_cast_page_refuses_to_truncate_int_columns():
+    schema = export._parquet_schema(["year"])
+
+    with pytest.raises(ValueError):
+        export._cast_page([{"year": 2026.5}], schema)
+
+
+def test_parquet_export_keeps_schema_across_pages(export_dir, pages):
+    pages(
+        [{"id": 1, "cost_planned": 1000, "risk_factor": None, "opex_type": None}],
+        [{"id": 2, "cost_planned": 1234.5, "risk_factor": 3, "opex_type": "Lizenzen"}],
+    )
+
+    name, rows = export.write_export(export.DS_PROJECTS, "Parquet")
+
+    table = pq.read_table(os.path.join(export_dir, name))
+    assert rows == 2
+    assert table.schema.field("cost_planned").type == pa.float64()
+    assert table.column("cost_planned").to_pylist() == [1000.0, 1234.5]
+    assert table.column("opex_type").to_pylist() == [None, "Lizenzen"]
+
+
+# --- CSV / DATEIEN ---
+def test_csv_export_uses_standard_format(export_dir, pages):
+    pages([{"id": 1, "cost_actual": 12.5}])
+
+    name, rows = export.write_export(export.DS_ACTUALS, "CSV")
+
+    with open(os.path.join(export_dir, name), newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["id", "cost_actual"], ["1", "12.5"]]
+
+
+@pytest.mark.parametrize("fmt", list(export.EXPORT_FORMATS))
+def test_empty_export_returns_no_file(export_dir, pages, fmt):
+    pages()
+
+    assert export.write_export(export.DS_PROJECTS, fmt) == (None, 0)
+    assert os.listdir(export_dir) == []
+
+
+def test_export_over_size_limit_is_rejected(export_dir, pages, monkeypatch):
+    pages([{"id": 1}])
+    monkeypatch.setattr(export, "EXPORT_MAX_BYTES", 1)
+
+    with pytest.raises(ValueError):
+        export.write_export(export.DS_PROJECTS, "CSV")
+    assert os.listdir(export_dir) == []
+
+
+def test_cleanup_removes_only_old_files(export_dir):
+    old, new = export_dir / "alt.csv", export_dir / "neu.csv"
+    old.write_text("x")
+    new.write_text("x")
+    os.utime(old, (0, 0))
+
+    export.cleanup_exports()
+
+    assert os.listdir(export_dir) == ["neu.csv"]
+
+
+# --- IST-KOSTEN ---
+def test_actuals_are_filtered_in_the_database(mock_db):
+    requests = mock_db(lambda request: httpx.Response(200, json=[] if int(request.url.params.get("offset", 0)) else [
+        {"id": 1, "project_id": 7, "cost_actual": 5, "digital_projects": {"scenario": "Budget", "category": "IT"}},
+    ]))
+
+    rows = [r for page in export._iter_actuals(scenario="Budget", year=2026) for r in page]
+
+    assert rows == [{"id": 1, "project_id": 7, "cost_actual": 5, "scenario": "Budget", "category": "IT"}]
+    params = requests[0].url.params
+    assert "digital_projects!inner(scenario,category)" in params["select"].replace(" ", "")
+    assert params["digital_projects.scenario"] == "eq.Budget"
+    assert params["year"] == "eq.2026"
+
+
+def test_actuals_without_project_filter_keep_rows_without_project(mock_db):
+    requests = mock_db(lambda request: httpx.Response(200, json=[] if int(request.url.params.get("offset", 0)) else [
+        {"id": 1, "project_id": None, "cost_actual": 5, "digital_projects": None},
+    ]))
+
+    rows = [r for page in export._iter_actuals() for r in page]
+
+    assert rows[0]["scenario"] is None
+    assert "!inner" not in requests[0].url.params["select"]